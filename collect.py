@@ -0,0 +1,26 @@
+# ----- collect.py (Reddit + Twitter in one process) -----
+import asyncio       # Both collectors share one event loop
+from mongo import connect_posts_collection # Shared MongoDB connection
+from collect_reddit import reddit_collect
+from collect_twitter import twitter_collect
+
+
+# Reddit and Twitter API calls interleave with each other and with both Mongo writers.
+# Also awaited by run_all_tasks.py, next to the PostgreSQL collectors.
+async def collect_social(posts_collection):
+    await asyncio.gather(
+        reddit_collect(posts_collection),
+        twitter_collect(posts_collection),
+    )
+
+
+if __name__ == '__main__':
+    print("--- Starting Social Media Collection Script ---")
+
+    # --- Database Connection Setup ---
+    # One MongoClient (one pool, one set of TLS handshakes) and one index check for both collectors;
+    # mongo.py closes the client at process exit
+    posts_collection = connect_posts_collection()
+
+    asyncio.run(collect_social(posts_collection))
+    print("\n--- Social Media Collection Script Finished ---")
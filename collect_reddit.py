@@ -1,203 +1,188 @@
 # ----- collect_reddit.py (Updated - With MongoDB Insertion) -----
-import praw          # Reddit API wrapper
+import asyncpraw     # Async Reddit API wrapper
+import asyncio       # Concurrent fetches
 import os            # Access environment variables (Replit Secrets)
 import json          # To print output nicely
-import time          # For delays
-from datetime import datetime # Timestamps
-from pymongo import MongoClient # MongoDB Driver
-from pymongo.errors import ConnectionFailure, DuplicateKeyError # Error types
-import sys
-
-print("--- Starting Reddit Collection Script ---")
-
-# --- Database Connection Setup ---
-mongo_client = None
-db = None
-posts_collection = None
-try:
-    print("Reading MONGO_URI from Replit Secrets...")
-    mongo_uri = os.environ.get('MONGO_URI')
-    if not mongo_uri:
-        print(">>> Error: MONGO_URI secret not found!")
-        sys.exit(1)
-
-    print("Connecting to MongoDB Atlas...")
-    mongo_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
-    mongo_client.admin.command('ismaster') # Force connection check
-    db = mongo_client['web3_data'] # Use same DB name as Twitter script
-    posts_collection = db['social_media_posts'] # Use same collection
-    print("MongoDB connection successful!")
-    # Ensure index exists for duplicate checking
-    # Using a compound index on source and source_specific_id for uniqueness across platforms
-    posts_collection.create_index([("source", 1), ("source_specific_id", 1)], unique=True)
-    print("Compound unique index on ('source', 'source_specific_id') ensured.")
-
-except ConnectionFailure as conn_err:
-     print(f">>> MongoDB Atlas Connection Failure: {conn_err}")
-     if mongo_client: mongo_client.close()
-     sys.exit(1)
-except Exception as db_err:
-    print(f">>> MongoDB connection/setup error: {db_err}")
-    if mongo_client: mongo_client.close()
-    sys.exit(1)
-
-# --- Reddit API Setup ---
-reddit = None
-try:
-    print("\nReading Reddit credentials from Replit Secrets...")
-    client_id = os.environ.get('REDDIT_CLIENT_ID')
-    client_secret = os.environ.get('REDDIT_CLIENT_SECRET')
-    user_agent = os.environ.get('REDDIT_USER_AGENT')
-    if not all([client_id, client_secret, user_agent]):
-        print(">>> Error: Missing Reddit credentials in Replit Secrets.")
-        sys.exit(1)
-    print("Reddit credentials loaded.")
-    print(f"User Agent: {user_agent}")
-
-    print("\nAttempting to authenticate with Reddit (read-only)...")
-    reddit = praw.Reddit(
-        client_id=client_id,
-        client_secret=client_secret,
-        user_agent=user_agent,
-        read_only=True
-    )
-    print(f"Authenticated successfully via PRAW. Read Only Mode: {reddit.read_only}")
-except Exception as praw_err:
-    print(f">>> Error initializing PRAW or authenticating: {praw_err}")
-    if mongo_client: mongo_client.close() # Close DB if PRAW fails
-    sys.exit(1)
+from datetime import datetime, timezone # Timestamps
+from mongo import connect_posts_collection, posts_writer, POSTS_KEY_INDEX, WRITE_QUEUE_SIZE # Shared MongoDB connection + writer
 
 # --- Collection Configuration ---
 target_subreddits = ['ethereum', 'CryptoCurrency', 'web3'] # Removed non-existent ones
 search_keywords = ['web3 developer salary', 'Coinbase hiring', 'blockchain skill demand', 'remote web3 role']
 collection_limit_per_source = 15 # Increase slightly if desired
+max_text_length = 2000 # Self-post bodies can be huge; sentiment analysis only needs the start
+max_concurrent_requests = 8 # Upper bound on in-flight Reddit API calls
 
 # --- Collect and Insert ---
 inserted_count = 0
 skipped_count = 0
 total_processed = 0
+known_ids = set()
+
+# Extract the submission dicts from a raw Reddit listing response
+def listing_posts(listing):
+    return [child['data'] for child in listing['data']['children'] if child.get('kind') == 't3']
 
 # Function to create document structure consistently
-def create_reddit_doc(submission, source_method, source_query):
+# Takes the raw listing JSON of a submission (plain dict lookups, no PRAW model objects);
+# sub_name and collected_at are loop-invariant, so callers compute them once per batch
+def create_reddit_doc(post, source_method, source_query, sub_name, collected_at):
     return {
         'source': 'reddit',
         'source_method': source_method,
         'source_query': source_query,
-        'source_specific_id': submission.id, # Use Reddit's submission ID
-        'title': submission.title,
-        'text': submission.selftext,
-        'author': submission.author.name if submission.author else '[deleted]',
-        'subreddit': submission.subreddit.display_name,
-        'url': f"https://www.reddit.com{submission.permalink}",
-        'score': submission.score,
-        'upvote_ratio': submission.upvote_ratio,
-        'num_comments': submission.num_comments,
-        'created_utc': datetime.utcfromtimestamp(submission.created_utc), # Store as datetime
-        'collected_at': datetime.utcnow(), # Store as datetime
-        # Optional: Store original PRAW object data if needed later
-        # 'raw_data': vars(submission) # Be careful, can be large/complex
+        'source_specific_id': post['id'], # Use Reddit's submission ID
+        'title': post['title'],
+        'text': post['selftext'][:max_text_length],
+        'author': post.get('author') or '[deleted]',
+        'subreddit': sub_name,
+        'url': "https://www.reddit.com" + post['permalink'],
+        'score': post['score'],
+        'upvote_ratio': post['upvote_ratio'],
+        'num_comments': post['num_comments'],
+        'created_utc': datetime.fromtimestamp(post['created_utc'], timezone.utc), # Store as datetime
+        'collected_at': collected_at, # Store as datetime (same BSON date type as the Twitter docs)
+        # Optional: Store the raw listing data if needed later
+        # 'raw_data': post # Be careful, can be large/complex
     }
 
 # --- Collect from Subreddits (New Posts) ---
-print(f"\nFetching {collection_limit_per_source} new posts from subreddits: {target_subreddits}...")
-try:
-    for sub_name in target_subreddits:
+# Producers stream each doc into the shared bounded queue; the single writer (see main) upserts them
+async def fetch_sub(reddit, semaphore, queue, sub_name):
+    global total_processed, skipped_count
+    async with semaphore:
         print(f" Accessing r/{sub_name}...")
-        subreddit = reddit.subreddit(sub_name)
-        posts_to_insert = []
         processed_in_batch = 0
+        queued_in_batch = 0
         try:
-            for submission in subreddit.new(limit=collection_limit_per_source):
+            # Raw listing JSON: one HTTP request, iterated as plain dicts
+            listing = await reddit.request(
+                method="GET", path=f"r/{sub_name}/new", params={"limit": collection_limit_per_source}
+            )
+            collected_at = datetime.now(timezone.utc) # Same timestamp for the whole batch
+            for post in listing_posts(listing):
                 processed_in_batch += 1
-                reddit_doc = create_reddit_doc(submission, 'subreddit_new', sub_name)
-                posts_to_insert.append(reddit_doc)
-            total_processed += processed_in_batch
-
-            # Attempt to insert batch, ignoring duplicates
-            if posts_to_insert:
-                 try:
-                      # Use insert_many with ordered=False to continue on duplicate errors
-                      insert_result = posts_collection.insert_many(posts_to_insert, ordered=False)
-                      inserted_count += len(insert_result.inserted_ids)
-                      skipped_in_batch = processed_in_batch - len(insert_result.inserted_ids)
-                      skipped_count += skipped_in_batch
-                      print(f"  Processed: {processed_in_batch}, Inserted: {len(insert_result.inserted_ids)}, Skipped (duplicates): {skipped_in_batch}")
-                 except DuplicateKeyError:
-                     # This might still catch if the *whole batch* only contains duplicates (less likely)
-                     skipped_count += len(posts_to_insert)
-                     print(f"  Processed: {processed_in_batch}, Inserted: 0, Skipped (all duplicates).")
-                 except Exception as batch_err:
-                      print(f"  > Error during bulk insert for r/{sub_name}: {batch_err}")
-                      # Consider incrementing skipped_count for all attempted in failed batch
-                      skipped_count += len(posts_to_insert)
-
+                if post['id'] in known_ids: # Already stored, skip without building the doc
+                    skipped_count += 1
+                    continue
+                reddit_doc = create_reddit_doc(post, 'subreddit_new', sub_name, sub_name, collected_at)
+                await queue.put(reddit_doc) # Blocks while the writer is behind (back-pressure)
+                queued_in_batch += 1
         except Exception as sub_err:
             print(f"  > Error processing subreddit r/{sub_name}: {sub_err}")
-        time.sleep(1)
-
-except Exception as e:
-    print(f">>> Error during subreddit collection phase: {e}")
+        total_processed += processed_in_batch
+        print(f"  r/{sub_name} - Processed: {processed_in_batch}, Queued for insert: {queued_in_batch}")
 
 # --- Collect using Search Keywords ---
-print(f"\nSearching top {collection_limit_per_source} posts (sorted by 'new') using keywords...")
-search_scope = '+'.join(target_subreddits)
-print(f"Search Scope: r/{search_scope}")
-try:
-    for keyword in search_keywords:
+async def fetch_search(reddit, semaphore, queue, search_scope, keyword):
+    global total_processed, skipped_count
+    async with semaphore:
         print(f" Searching for '{keyword}'...")
-        posts_to_insert = []
         processed_in_batch = 0
+        queued_in_batch = 0
         try:
-            search_results = reddit.subreddit(search_scope).search(
-                keyword, limit=collection_limit_per_source, sort='new'
+            listing = await reddit.request(
+                method="GET",
+                path=f"r/{search_scope}/search",
+                params={"q": keyword, "limit": collection_limit_per_source, "sort": "new", "restrict_sr": True},
             )
-            unique_ids_in_batch = set() # Track IDs within this search batch
+            collected_at = datetime.now(timezone.utc) # Same timestamp for the whole batch
 
-            for submission in search_results:
+            for post in listing_posts(listing):
                 processed_in_batch += 1
-                # Basic check within batch - full check happens on insert
-                if submission.id not in unique_ids_in_batch:
-                    reddit_doc = create_reddit_doc(submission, 'search', keyword)
-                    posts_to_insert.append(reddit_doc)
-                    unique_ids_in_batch.add(submission.id)
-                # Else: likely duplicate within search results, don't even add to batch
-            total_processed += processed_in_batch
-
-            if posts_to_insert:
-                try:
-                     insert_result = posts_collection.insert_many(posts_to_insert, ordered=False)
-                     inserted_count += len(insert_result.inserted_ids)
-                     skipped_in_batch = len(posts_to_insert) - len(insert_result.inserted_ids)
-                     skipped_count += skipped_in_batch
-                     print(f"  Processed: {processed_in_batch}, Inserted: {len(insert_result.inserted_ids)}, Skipped (duplicates): {skipped_in_batch}")
-                except DuplicateKeyError:
-                    skipped_count += len(posts_to_insert)
-                    print(f"  Processed: {processed_in_batch}, Inserted: 0, Skipped (all duplicates).")
-                except Exception as batch_err:
-                     print(f"  > Error during bulk insert for keyword '{keyword}': {batch_err}")
-                     skipped_count += len(posts_to_insert)
-            else:
-                print(f"  Processed: {processed_in_batch}, No unique items found to insert.")
-
+                if post['id'] in known_ids: # Already stored, skip without building the doc
+                    skipped_count += 1
+                    continue
+                # Repeats within the results are left to the unique index (counted as skipped on write)
+                reddit_doc = create_reddit_doc(post, 'search', keyword, post['subreddit'], collected_at)
+                await queue.put(reddit_doc)
+                queued_in_batch += 1
         except Exception as search_err:
             print(f"  > Error processing search for '{keyword}': {search_err}")
-        time.sleep(2)
-
-except Exception as e:
-    print(f">>> Error during search collection phase: {e}")
-
-
-# --- Cleanup ---
-finally:
-    print("\n--- Final Summary ---")
-    print(f"Total Reddit Items Processed (approx): {total_processed}")
-    print(f"New Items Inserted: {inserted_count}")
-    print(f"Items Skipped (Duplicate/Error): {skipped_count}")
-
-    print("Closing MongoDB connection...")
-    if mongo_client:
-        mongo_client.close()
-        print("MongoDB connection closed.")
-    else:
-        print("No MongoDB connection was active.")
-    print("\n--- Reddit Collection Script Finished ---")
\ No newline at end of file
+        total_processed += processed_in_batch
+        print(f"  keyword '{keyword}' - Processed: {processed_in_batch}, Queued for insert: {queued_in_batch}")
+
+# Ids already stored, fetched once so known posts are skipped before create_reddit_doc
+# touches any of their attributes. Only the indexed key is projected and the compound index
+# is hinted, so the existence data comes straight from the index (covered query).
+def load_known_ids(posts_collection):
+    return set(
+        d["source_specific_id"]
+        for d in posts_collection.find(
+            {"source": "reddit"}, {"source_specific_id": 1, "_id": 0}
+        ).hint(POSTS_KEY_INDEX)
+    )
+
+async def run_reddit(posts_collection, client_id, client_secret, user_agent):
+    global inserted_count, skipped_count, known_ids
+    known_ids = await asyncio.to_thread(load_known_ids, posts_collection)
+    print(f"Loaded {len(known_ids)} known Reddit post ids.")
+
+    print("\nAttempting to authenticate with Reddit (read-only)...")
+    async with asyncpraw.Reddit(
+        client_id=client_id,
+        client_secret=client_secret,
+        user_agent=user_agent,
+    ) as reddit:
+        print(f"Async PRAW client ready. Read Only Mode: {reddit.read_only}")
+
+        search_scope = '+'.join(target_subreddits)
+        print(f"\nFetching {collection_limit_per_source} new posts from subreddits: {target_subreddits}...")
+        print(f"Searching top {collection_limit_per_source} posts (sorted by 'new') using keywords in r/{search_scope}...")
+
+        # Fetching and Mongo writes overlap: producers fill the queue while the writer drains it
+        queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+        semaphore = asyncio.Semaphore(max_concurrent_requests)
+        writer_task = asyncio.create_task(posts_writer(queue, posts_collection))
+        try:
+            await asyncio.gather(
+                *(fetch_sub(reddit, semaphore, queue, sub_name) for sub_name in target_subreddits),
+                *(fetch_search(reddit, semaphore, queue, search_scope, keyword) for keyword in search_keywords),
+            )
+        finally:
+            await queue.put(None) # Sentinel: all producers finished
+            inserted, skipped = await writer_task
+            inserted_count += inserted
+            skipped_count += skipped
+
+        # No fixed sleeps between requests: Async PRAW's rate limiter paces calls from Reddit's
+        # X-Ratelimit-* response headers, waiting only as long as the remaining quota requires
+        limits = reddit.auth.limits
+        print(f"Reddit rate limit - Used: {limits.get('used')}, Remaining: {limits.get('remaining')}")
+
+# Entry point shared by this script and collect.py; posts_collection comes from the caller
+# so several collectors can run in one event loop on one MongoClient
+async def reddit_collect(posts_collection):
+    global inserted_count, skipped_count, total_processed
+    inserted_count = 0
+    skipped_count = 0
+    total_processed = 0
+    print("--- Starting Reddit Collection ---")
+
+    # --- Reddit API Setup ---
+    print("\nReading Reddit credentials from Replit Secrets...")
+    client_id = os.environ.get('REDDIT_CLIENT_ID')
+    client_secret = os.environ.get('REDDIT_CLIENT_SECRET')
+    user_agent = os.environ.get('REDDIT_USER_AGENT')
+    if not all([client_id, client_secret, user_agent]):
+        print(">>> Error: Missing Reddit credentials in Replit Secrets.")
+        return
+    print("Reddit credentials loaded.")
+    print(f"User Agent: {user_agent}")
+
+    try:
+        await run_reddit(posts_collection, client_id, client_secret, user_agent)
+    except Exception as e:
+        print(f">>> Error during Reddit collection: {e}")
+
+    # --- Cleanup ---
+    finally:
+        print("\n--- Reddit Final Summary ---")
+        print(f"Total Reddit Items Processed (approx): {total_processed}")
+        print(f"New Items Inserted: {inserted_count}")
+        print(f"Items Skipped (Duplicate/Error): {skipped_count}")
+        print("\n--- Reddit Collection Finished ---")
+
+if __name__ == '__main__':
+    print("--- Starting Reddit Collection Script ---")
+    asyncio.run(reddit_collect(connect_posts_collection()))
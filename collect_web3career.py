@@ -1,385 +1,239 @@
 # ----- collect_web3career.py (Updated Version - With PostgreSQL Insertion) -----
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import os
-import json
 import time
 from datetime import datetime
-import psycopg2 # Import PostgreSQL driver
-import sys      # To cleanly exit on major errors
-
-print("--- Starting Web3.Career Collection Script ---")
-
-# --- Database Connection Setup ---
-db_conn = None
-db_cursor = None
-try:
-    print("Reading POSTGRES_URI from Replit Secrets...")
-    db_uri = os.environ.get('POSTGRES_URI')
-    if not db_uri:
-        print(">>> Error: POSTGRES_URI secret not found or is empty!")
-        print(">>> Please add the connection string from Neon (or your provider) to Replit Secrets.")
-        sys.exit(1) # Exit if DB URI is missing
-
-    print("Connecting to external PostgreSQL database (Neon)...")
-    db_conn = psycopg2.connect(db_uri)
-    db_cursor = db_conn.cursor()
-    print("Database connection successful!")
-
-    # Verify table exists (optional check)
-    db_cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'job_postings');")
-    table_exists = db_cursor.fetchone()[0]
-    if not table_exists:
-         print(">>> Error: 'job_postings' table does not exist in the database!")
-         print(">>> Please run the CREATE TABLE script in your Neon SQL Editor first.")
-         sys.exit(1)
-    else:
-        print("'job_postings' table found.")
-
-except Exception as db_err:
-    print(f">>> Database connection error: {db_err}")
-    # Ensure connection/cursor are closed if partially opened
-    if db_cursor: db_cursor.close()
-    if db_conn: db_conn.close()
-    sys.exit(1) # Exit if DB connection fails
-
-# --- API Connection Setup ---
-api_key = None
-try:
-    print("\nReading WEB3_CAREER_API_KEY from Replit Secrets...")
-    api_key = os.environ.get('WEB3_CAREER_API_KEY')
-    if not api_key:
-        print(">>> Error: WEB3_CAREER_API_KEY secret not found.")
-        sys.exit(1)
-    else:
-         print(f"API Key loaded successfully (starts with: {api_key[:4]}...).")
-except Exception as key_err:
-    print(f">>> Error reading API key: {key_err}")
-    sys.exit(1)
-
+import atexit
+import orjson   # Fast C JSON encoder (returns bytes)
+import ijson    # Incremental JSON parser (streams the API response)
+from psycopg.types.json import Jsonb # Binary jsonb adapter for the raw API response
+from postgres import check_job_postings_table, connect_job_database, copy_into_job_postings # Shared PostgreSQL connection
 
 # --- API Request Configuration ---
 api_endpoint = "https://web3.career/api/v1"
-params = {
-    'token': api_key,
+base_params = {
     'limit': 100,
     'show_description': 'true'
     # Add other filters here if needed, e.g.: 'remote': 'true',
 }
-printable_params = {k: v for k, v in params.items() if k != 'token'}
-print(f"\nRequesting data from: {api_endpoint}")
-print(f"With parameters: {printable_params}")
-
-
-# --- Fetch and Process ---
-inserted_count = 0
-skipped_count = 0
-api_error = False
-
-try:
-    print("\nSending GET request to the API...")
-    response = requests.get(api_endpoint, params=params, timeout=25)
-    print(f"API request status: {response.status_code}")
-    response.raise_for_status() # Check for HTTP errors
-
-    print("Attempting to parse JSON response...")
-    raw_data = response.json()
-    print("JSON parsing successful.")
-
-    jobs_list = []
-    if isinstance(raw_data, list) and len(raw_data) > 2 and isinstance(raw_data[2], list):
-        jobs_list = raw_data[2]
-    else:
-        print(">>> Warning: API response structure not as expected (list[2] not found or not a list). Check API documentation or raw response.")
-        # Optional: print raw_data for deep debugging
-        # print(json.dumps(raw_data, indent=2))
-
-    print(f"\nProcessing {len(jobs_list)} potential job entries from API...")
 
-    for job_entry in jobs_list:
-        if not isinstance(job_entry, dict):
-            print(f"Warning: Skipping item, not a dictionary: {job_entry}")
-            skipped_count += 1
-            continue
-
-        # Extract data (use .get with default=None for safety)
-        external_id = str(job_entry.get('id')) if job_entry.get('id') is not None else None
-        title = job_entry.get('title')
-        company = job_entry.get('company')
-        location = job_entry.get('location') # Contains city/country often
-        country = job_entry.get('country')
-        city = job_entry.get('city')
-        apply_url = job_entry.get('apply_url')
-        tags_list = job_entry.get('tags', []) # Ensure it's a list
-        description = job_entry.get('description')
-        date_epoch = job_entry.get('date_epoch')
-        # Infer remote status based on tags or location info if possible
-        is_remote = 'remote' in [tag.lower() for tag in tags_list if isinstance(tag, str)] if tags_list else None
-        # Add a placeholder for salary if the API provides it later
-        salary = job_entry.get('salary_range') # Check actual key name
-
-        # Prepare data for insertion
-        # Only insert if we have a title and a unique URL
-        if title and apply_url:
-            sql_insert_query = """
-                INSERT INTO job_postings (
-                    title, company_name, location, salary_range, tags, source,
-                    job_url, description, external_id, is_remote, date_posted_epoch,
-                    raw_api_response
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                )
-                ON CONFLICT (job_url) DO NOTHING;
-            """
-            # Use json.dumps for the raw response if storing it
-            raw_json_str = json.dumps(job_entry) if job_entry else None
-            data_to_insert = (
-                title, company, location, salary, tags_list, 'Web3.Career',
-                apply_url, description, external_id, is_remote, date_epoch,
-                raw_json_str # Insert raw JSON here
-            )
-
-            try:
-                db_cursor.execute(sql_insert_query, data_to_insert)
-                # Check if a row was actually inserted (0 means conflict/duplicate)
-                if db_cursor.rowcount > 0:
-                    inserted_count += 1
-                else:
-                    skipped_count += 1
-            except Exception as insert_err:
-                print(f"  > DB insert error for job ID {external_id} ({title}): {insert_err}")
-                db_conn.rollback() # Rollback failed transaction for this job
-                skipped_count += 1
-        else:
-             print(f"Skipping job entry due to missing title or apply_url: {external_id}")
-             skipped_count += 1
-
-    # Commit all successful insertions after the loop
-    db_conn.commit()
-    print(f"\nDatabase commit successful.")
-
-
-# --- Error Handling for API Request/Parsing ---
-except requests.exceptions.HTTPError as http_err:
-    print(f"\n>>> HTTP error occurred: {http_err}")
-    if response is not None:
-         print(f"Status Code: {response.status_code}, Response: {response.text[:500]}")
-    api_error = True
-except requests.exceptions.RequestException as req_err:
-    print(f"\n>>> Request error occurred: {req_err}")
-    api_error = True
-except json.JSONDecodeError:
-    print("\n>>> Error: Failed to decode JSON response from API.")
-    if response is not None: print(f"Response text snippet: {response.text[:500]}")
-    api_error = True
-except Exception as proc_err:
-    print(f"\n>>> An unexpected error occurred during processing: {proc_err}")
-    api_error = True # Treat as API/Processing error
-    import traceback
-    traceback.print_exc()
-
-
-# --- Cleanup ---
-finally:
-    print("\n--- Final Summary ---")
-    print(f"Jobs Inserted: {inserted_count}")
-    print(f"Jobs Skipped (Duplicate/Error/Incomplete): {skipped_count}")
-    if api_error:
-         print(">>> There was an error fetching or processing data from the API.")
-
-    print("Closing database connection...")
-    if db_cursor: db_cursor.close()
-    if db_conn: db_conn.close()
-    print("Database connection closed.")
-    print("\n--- Web3.Career Collection Script Finished ---")# ----- collect_web3career.py (Updated Version - With PostgreSQL Insertion) -----
-import requests
-import os
-import json
-import time
-from datetime import datetime
-import psycopg2 # Import PostgreSQL driver
-import sys      # To cleanly exit on major errors
-
-print("--- Starting Web3.Career Collection Script ---")
-
-# --- Database Connection Setup ---
-db_conn = None
-db_cursor = None
-try:
-    print("Reading POSTGRES_URI from Replit Secrets...")
-    db_uri = os.environ.get('POSTGRES_URI')
-    if not db_uri:
-        print(">>> Error: POSTGRES_URI secret not found or is empty!")
-        print(">>> Please add the connection string from Neon (or your provider) to Replit Secrets.")
-        sys.exit(1) # Exit if DB URI is missing
-
-    print("Connecting to external PostgreSQL database (Neon)...")
-    db_conn = psycopg2.connect(db_uri)
-    db_cursor = db_conn.cursor()
-    print("Database connection successful!")
-
-    # Verify table exists (optional check)
-    db_cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'job_postings');")
-    table_exists = db_cursor.fetchone()[0]
-    if not table_exists:
-         print(">>> Error: 'job_postings' table does not exist in the database!")
-         print(">>> Please run the CREATE TABLE script in your Neon SQL Editor first.")
-         sys.exit(1)
-    else:
-        print("'job_postings' table found.")
-
-except Exception as db_err:
-    print(f">>> Database connection error: {db_err}")
-    # Ensure connection/cursor are closed if partially opened
-    if db_cursor: db_cursor.close()
-    if db_conn: db_conn.close()
-    sys.exit(1) # Exit if DB connection fails
-
-# --- API Connection Setup ---
-api_key = None
-try:
+# Case-folded tag values that mark a job as remote (one set lookup per tag)
+REMOTE_TAG_VALUES = frozenset({'remote', 'remote-only', 'wfh'})
+JOBS_INDEX = 2 # The API answers [meta, meta, [jobs...]]
+INSERT_BATCH_SIZE = 500 # Max jobs held in memory / sent per INSERT
+
+# One pooled session: keep-alive connections, plus retries with backoff on throttling/5xx
+session = requests.Session()
+session.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, status_forcelist=[429, 500, 502, 503, 504], backoff_factor=0.3),
+))
+atexit.register(session.close) # Kept open across runs in a long-lived process
+
+
+# --- Bulk Load Configuration ---
+# Staged columns (in row order) and their Postgres types, see postgres.copy_into_job_postings
+STAGE_COLUMNS = [
+    'title', 'company_name', 'location', 'salary_range', 'tags',
+    'job_url', 'description', 'external_id', 'is_remote', 'date_posted_epoch', 'raw_api_response',
+]
+STAGE_TYPES = ['text', 'text', 'text', 'text', 'text[]', 'text', 'text', 'text', 'bool', 'int8', 'jsonb']
+
+
+# The binary COPY applies no server-side casts, so every staged value must already be the
+# Python type of its column: raw API values are coerced here (anything else fails the batch).
+# Only scalars become text; a dict/list is malformed data, stored as NULL rather than its repr
+# (the untouched value is still in raw_api_response)
+def as_text(value):
+    return str(value) if isinstance(value, (str, int, float)) else None # bool is an int
+
+
+def as_epoch(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError): # e.g. '' or a non-numeric string
+        return None
+
+
+# Keeps only the ijson events of the top-level array itself and of its element at `index`,
+# so ijson.items(..., 'item.item') yields that element's entries and nothing else
+def top_level_element_events(events, index):
+    depth = 0
+    element = -1
+    for prefix, event, value in events:
+        if event in ('start_map', 'start_array'):
+            if depth == 1:
+                element += 1
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+        elif depth == 1:
+            element += 1 # Scalar element of the top-level array
+        if depth == 0 or element == index:
+            yield prefix, event, value
+
+
+# Entry point shared by this script and run_all_tasks.py; db_conn comes from the caller so
+# every job collector in the process reuses one PostgreSQL connection.
+# Raises on missing secrets or a missing table instead of exiting the process.
+def run(db_conn):
+    print("--- Starting Web3.Career Collection ---")
+
+    # --- API Connection Setup ---
     print("\nReading WEB3_CAREER_API_KEY from Replit Secrets...")
     api_key = os.environ.get('WEB3_CAREER_API_KEY')
     if not api_key:
-        print(">>> Error: WEB3_CAREER_API_KEY secret not found.")
-        sys.exit(1)
-    else:
-         print(f"API Key loaded successfully (starts with: {api_key[:4]}...).")
-except Exception as key_err:
-    print(f">>> Error reading API key: {key_err}")
-    sys.exit(1)
-
-
-# --- API Request Configuration ---
-api_endpoint = "https://web3.career/api/v1"
-params = {
-    'token': api_key,
-    'limit': 100,
-    'show_description': 'true'
-    # Add other filters here if needed, e.g.: 'remote': 'true',
-}
-printable_params = {k: v for k, v in params.items() if k != 'token'}
-print(f"\nRequesting data from: {api_endpoint}")
-print(f"With parameters: {printable_params}")
-
-
-# --- Fetch and Process ---
-inserted_count = 0
-skipped_count = 0
-api_error = False
-
-try:
-    print("\nSending GET request to the API...")
-    response = requests.get(api_endpoint, params=params, timeout=25)
-    print(f"API request status: {response.status_code}")
-    response.raise_for_status() # Check for HTTP errors
-
-    print("Attempting to parse JSON response...")
-    raw_data = response.json()
-    print("JSON parsing successful.")
-
-    jobs_list = []
-    if isinstance(raw_data, list) and len(raw_data) > 2 and isinstance(raw_data[2], list):
-        jobs_list = raw_data[2]
-    else:
-        print(">>> Warning: API response structure not as expected (list[2] not found or not a list). Check API documentation or raw response.")
-        # Optional: print raw_data for deep debugging
-        # print(json.dumps(raw_data, indent=2))
-
-    print(f"\nProcessing {len(jobs_list)} potential job entries from API...")
-
-    for job_entry in jobs_list:
-        if not isinstance(job_entry, dict):
-            print(f"Warning: Skipping item, not a dictionary: {job_entry}")
-            skipped_count += 1
-            continue
-
-        # Extract data (use .get with default=None for safety)
-        external_id = str(job_entry.get('id')) if job_entry.get('id') is not None else None
-        title = job_entry.get('title')
-        company = job_entry.get('company')
-        location = job_entry.get('location') # Contains city/country often
-        country = job_entry.get('country')
-        city = job_entry.get('city')
-        apply_url = job_entry.get('apply_url')
-        tags_list = job_entry.get('tags', []) # Ensure it's a list
-        description = job_entry.get('description')
-        date_epoch = job_entry.get('date_epoch')
-        # Infer remote status based on tags or location info if possible
-        is_remote = 'remote' in [tag.lower() for tag in tags_list if isinstance(tag, str)] if tags_list else None
-        # Add a placeholder for salary if the API provides it later
-        salary = job_entry.get('salary_range') # Check actual key name
-
-        # Prepare data for insertion
-        # Only insert if we have a title and a unique URL
-        if title and apply_url:
-            sql_insert_query = """
-                INSERT INTO job_postings (
-                    title, company_name, location, salary_range, tags, source,
-                    job_url, description, external_id, is_remote, date_posted_epoch,
-                    raw_api_response
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                )
-                ON CONFLICT (job_url) DO NOTHING;
-            """
-            # Use json.dumps for the raw response if storing it
-            raw_json_str = json.dumps(job_entry) if job_entry else None
-            data_to_insert = (
-                title, company, location, salary, tags_list, 'Web3.Career',
-                apply_url, description, external_id, is_remote, date_epoch,
-                raw_json_str # Insert raw JSON here
-            )
+        raise RuntimeError("WEB3_CAREER_API_KEY secret not found.")
+    print(f"API Key loaded successfully (starts with: {api_key[:4]}...).")
+    params = {'token': api_key, **base_params}
+    print(f"\nRequesting data from: {api_endpoint}")
+    print(f"With parameters: {base_params}")
 
+    db_cursor = db_conn.cursor()
+    try:
+        check_job_postings_table(db_cursor)
+    except Exception:
+        db_cursor.close()
+        raise
+
+    # --- Fetch and Process ---
+    inserted_count = 0
+    skipped_count = 0
+    api_error = False
+    response = None # Bound before the request so the error handlers can check it
+
+    try:
+        print("\nSending GET request to the API...")
+        response = session.get(api_endpoint, params=params, timeout=25, stream=True)
+        print(f"API request status: {response.status_code}")
+        response.raise_for_status() # Check for HTTP errors
+
+        # Parse the body incrementally: job dicts are built one at a time as the bytes arrive
+        # and are flushed to the DB in batches, so memory is bounded by the batch, not the response
+        print("Streaming JSON response...")
+        response.raw.decode_content = True # Undo gzip/deflate while reading the raw stream
+        events = ijson.parse(response.raw, use_float=True) # Plain floats: orjson can't encode Decimal
+        jobs_iter = ijson.items(top_level_element_events(events, JOBS_INDEX), 'item.item')
+
+        # One list per staged column (same order), filled directly, zipped into rows for COPY
+        titles, companies, locations, salaries, tag_arrays = [], [], [], [], []
+        job_urls, descriptions, external_ids, remote_flags, dates, raw_jsons = [], [], [], [], [], []
+        columns = [
+            titles, companies, locations, salaries, tag_arrays,
+            job_urls, descriptions, external_ids, remote_flags, dates, raw_jsons,
+        ]
+
+        def flush_batch():
+            nonlocal inserted_count, skipped_count
+            batch_size = len(titles)
+            if not batch_size:
+                return
             try:
-                db_cursor.execute(sql_insert_query, data_to_insert)
-                # Check if a row was actually inserted (0 means conflict/duplicate)
-                if db_cursor.rowcount > 0:
-                    inserted_count += 1
-                else:
-                    skipped_count += 1
+                # COPY into a staging table + one INSERT ... SELECT (conflicts/duplicates are not counted)
+                batch_inserted = copy_into_job_postings(
+                    db_cursor, 'web3career_stage', STAGE_COLUMNS, STAGE_TYPES, zip(*columns), 'Web3.Career'
+                )
+                db_conn.commit() # Per batch, so a later failing batch can't roll this one back
+                print(f"  Committed batch of {batch_size} jobs ({batch_inserted} new).")
+                inserted_count += batch_inserted
+                skipped_count += batch_size - batch_inserted
             except Exception as insert_err:
-                print(f"  > DB insert error for job ID {external_id} ({title}): {insert_err}")
-                db_conn.rollback() # Rollback failed transaction for this job
+                print(f"  > DB batch insert error for {batch_size} jobs: {insert_err}")
+                db_conn.rollback() # Rollback the failed batch
+                skipped_count += batch_size
+            for column in columns:
+                column.clear()
+
+        processed_count = 0
+        for job_entry in jobs_iter:
+            processed_count += 1
+            if not isinstance(job_entry, dict):
+                print(f"Warning: Skipping item, not a dictionary: {job_entry}")
                 skipped_count += 1
-        else:
-             print(f"Skipping job entry due to missing title or apply_url: {external_id}")
-             skipped_count += 1
-
-    # Commit all successful insertions after the loop
-    db_conn.commit()
-    print(f"\nDatabase commit successful.")
-
-
-# --- Error Handling for API Request/Parsing ---
-except requests.exceptions.HTTPError as http_err:
-    print(f"\n>>> HTTP error occurred: {http_err}")
-    if response is not None:
-         print(f"Status Code: {response.status_code}, Response: {response.text[:500]}")
-    api_error = True
-except requests.exceptions.RequestException as req_err:
-    print(f"\n>>> Request error occurred: {req_err}")
-    api_error = True
-except json.JSONDecodeError:
-    print("\n>>> Error: Failed to decode JSON response from API.")
-    if response is not None: print(f"Response text snippet: {response.text[:500]}")
-    api_error = True
-except Exception as proc_err:
-    print(f"\n>>> An unexpected error occurred during processing: {proc_err}")
-    api_error = True # Treat as API/Processing error
-    import traceback
-    traceback.print_exc()
-
-
-# --- Cleanup ---
-finally:
-    print("\n--- Final Summary ---")
-    print(f"Jobs Inserted: {inserted_count}")
-    print(f"Jobs Skipped (Duplicate/Error/Incomplete): {skipped_count}")
-    if api_error:
-         print(">>> There was an error fetching or processing data from the API.")
-
-    print("Closing database connection...")
-    if db_cursor: db_cursor.close()
-    if db_conn: db_conn.close()
-    print("Database connection closed.")
-    print("\n--- Web3.Career Collection Script Finished ---")
\ No newline at end of file
+                continue
+
+            # Extract data (use .get with default=None for safety); each key is looked up once
+            get = job_entry.get
+            external_id = as_text(get('id'))
+            title = as_text(get('title'))
+            company = as_text(get('company'))
+            location = as_text(get('location')) # Contains city/country often
+            apply_url = as_text(get('apply_url'))
+            tags_list = get('tags') or [] # Ensure it's a list (the API may send null)
+            if not isinstance(tags_list, list):
+                tags_list = [tags_list] # A lone tag value instead of a list
+            description = as_text(get('description'))
+            date_epoch = as_epoch(get('date_epoch'))
+            # Case-folded once per job (Unicode-correct, unlike lower()); reuse for any tag-derived column
+            tags_lower = [tag.casefold() for tag in tags_list if isinstance(tag, str)]
+            # Infer remote status based on tags or location info if possible
+            is_remote = not REMOTE_TAG_VALUES.isdisjoint(tags_lower) if tags_list else None
+            # Add a placeholder for salary if the API provides it later
+            salary = as_text(get('salary_range')) # Check actual key name
+
+            # Prepare data for insertion
+            # Only insert if we have a title and a unique URL
+            if title and apply_url:
+                # Jsonb wraps the dict directly; orjson serializes it straight to UTF-8 bytes
+                raw_json = Jsonb(job_entry, dumps=orjson.dumps) if job_entry else None
+                titles.append(title)
+                companies.append(company)
+                locations.append(location)
+                salaries.append(salary)
+                tag_arrays.append([tag for tag in tags_list if isinstance(tag, str)]) # Same filter as tags_lower: no 'None'/repr tags
+                job_urls.append(apply_url)
+                descriptions.append(description)
+                external_ids.append(external_id)
+                remote_flags.append(is_remote)
+                dates.append(date_epoch)
+                raw_jsons.append(raw_json) # Insert raw JSON here
+                if len(titles) >= INSERT_BATCH_SIZE:
+                    flush_batch()
+            else:
+                 print(f"Skipping job entry due to missing title or apply_url: {external_id}")
+                 skipped_count += 1
+
+        flush_batch()
+        print(f"\nProcessed {processed_count} potential job entries from API.")
+        if not processed_count:
+            print(">>> Warning: No job entries found (list[2] missing, empty or not a list). Check API documentation or raw response.")
+
+
+    # --- Error Handling for API Request/Parsing ---
+    except requests.exceptions.HTTPError as http_err:
+        print(f"\n>>> HTTP error occurred: {http_err}")
+        if response is not None:
+             print(f"Status Code: {response.status_code}, Response: {response.text[:500]}")
+        api_error = True
+    except requests.exceptions.RequestException as req_err:
+        print(f"\n>>> Request error occurred: {req_err}")
+        api_error = True
+    except ijson.JSONError as json_err:
+        # The stream is already (partly) consumed, so there is no response text left to show
+        print(f"\n>>> Error: Failed to decode JSON response from API: {json_err}")
+        api_error = True
+    except Exception as proc_err:
+        print(f"\n>>> An unexpected error occurred during processing: {proc_err}")
+        api_error = True # Treat as API/Processing error
+        import traceback
+        traceback.print_exc()
+
+
+    # --- Cleanup ---
+    finally:
+        print("\n--- Final Summary ---")
+        print(f"Jobs Inserted: {inserted_count}")
+        print(f"Jobs Skipped (Duplicate/Error/Incomplete): {skipped_count}")
+        if api_error:
+             print(">>> There was an error fetching or processing data from the API.")
+
+        db_cursor.close() # The connection itself belongs to the caller
+        print("\n--- Web3.Career Collection Finished ---")
+
+
+if __name__ == '__main__':
+    print("--- Starting Web3.Career Collection Script ---")
+    run(connect_job_database())
@@ -0,0 +1,129 @@
+# ----- mongo.py (Shared MongoDB Connection) -----
+import asyncio       # Writer coroutine for the collectors' producer/consumer pipeline
+import atexit        # Close the shared client once, when the process exits
+import os            # Access environment variables (Replit Secrets)
+import bson          # BSON encoder shipped with pymongo
+import sys
+from pymongo import MongoClient, UpdateOne # MongoDB Driver
+from pymongo.errors import ConnectionFailure # Error types
+
+MONGO_DB_NAME = 'web3_data'
+POSTS_COLLECTION_NAME = 'social_media_posts'
+WRITE_QUEUE_SIZE = 500 # Max docs buffered between fetchers and the writer (back-pressure)
+WRITE_BATCH_SIZE = 100 # Max docs per bulk_write
+
+# One client per process: the driver keeps its own connection pool, so reusing the
+# client avoids a fresh TLS handshake + server selection + auth on every run
+_mongo_client = None
+# Index setup costs listIndexes/createIndexes round-trips, so it runs once per process
+_indexes_ensured = False
+POSTS_KEY_INDEX = [("source", 1), ("source_specific_id", 1)]
+LEGACY_INDEXES = ("source_specific_id_1", "source_1") # Old single-field Twitter indexes
+
+
+def get_client():
+    global _mongo_client
+    if _mongo_client is None:
+        mongo_uri = os.environ.get('MONGO_URI')
+        if not mongo_uri:
+            raise RuntimeError("MONGO_URI secret not found or is empty!")
+        client = MongoClient(
+            mongo_uri,
+            maxPoolSize=50,
+            minPoolSize=5,
+            serverSelectionTimeoutMS=5000, # Handle connection issues quickly
+        )
+        client.admin.command('ismaster') # Force connection check (cheap, no auth needed)
+        if not bson.has_c():
+            # Without the _cbson extension every document is encoded in pure Python
+            print(">>> Warning: pymongo's C extension (bson._cbson) is not available; BSON encoding will be slow.")
+        _mongo_client = client
+        atexit.register(client.close) # Single close for every collector sharing this process
+    return _mongo_client
+
+
+def ensure_indexes(collection):
+    global _indexes_ensured
+    if _indexes_ensured:
+        return
+    # Compound unique index for duplicate checking across platforms (default name, used by every collector)
+    collection.create_index(POSTS_KEY_INDEX, unique=True)
+    print("Compound unique index on ('source', 'source_specific_id') ensured.")
+    # One-time migration: drop the old single-field indexes, the compound index covers both lookups
+    existing_indexes = collection.index_information()
+    for legacy_index in LEGACY_INDEXES:
+        if legacy_index in existing_indexes:
+            collection.drop_index(legacy_index)
+            print(f"Dropped legacy index '{legacy_index}'.")
+    _indexes_ensured = True
+
+
+# client defaults to the shared one; callers that already hold a client (run_all_tasks.py) pass it in
+def get_collection(client=None):
+    collection = (client or get_client())[MONGO_DB_NAME][POSTS_COLLECTION_NAME]
+    ensure_indexes(collection)
+    return collection
+
+
+# Connection setup shared by the collector entry points: prints progress and exits the
+# process on failure, since nothing can be collected without the database
+def connect_posts_collection():
+    try:
+        print("Connecting to MongoDB Atlas (MONGO_URI from Replit Secrets)...")
+        posts_collection = get_collection() # Shared, pooled client; indexes ensured once per process
+        print("MongoDB connection successful!")
+        return posts_collection
+    except ConnectionFailure as conn_err:
+        print(f">>> MongoDB Atlas Connection Failure: {conn_err}")
+        print(">>> Check your MONGO_URI string, network access rules in Atlas, and if the cluster is active.")
+        sys.exit(1)
+    except Exception as db_err:
+        print(f">>> MongoDB connection/setup error: {db_err}")
+        sys.exit(1)
+
+
+# Insert posts that are not stored yet, keyed on (source, source_specific_id).
+# $setOnInsert upserts never raise on duplicates, so the counts come straight from the result.
+# Returns (inserted, skipped).
+def upsert_posts(collection, docs):
+    ops = [
+        UpdateOne(
+            {"source": doc["source"], "source_specific_id": doc["source_specific_id"]},
+            {"$setOnInsert": doc},
+            upsert=True,
+        )
+        for doc in docs
+    ]
+    if not ops:
+        return 0, 0
+    result = collection.bulk_write(ops, ordered=False)
+    return result.upserted_count, len(ops) - result.upserted_count
+
+
+# Single consumer of a collector's doc queue: takes whatever is waiting (up to batch_size docs),
+# upserts it in one bulk_write and goes back for more, so Mongo writes overlap with API fetches.
+# Producers put one doc at a time and finish with a None sentinel. Returns (inserted, skipped).
+async def posts_writer(queue, collection, batch_size=WRITE_BATCH_SIZE):
+    inserted_total = 0
+    skipped_total = 0
+    finished = False
+    while not finished:
+        batch = []
+        item = await queue.get()
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= batch_size or queue.empty():
+                break
+            item = queue.get_nowait()
+        finished = item is None
+        if not batch:
+            continue
+        try:
+            inserted, skipped = await asyncio.to_thread(upsert_posts, collection, batch)
+        except Exception as write_err:
+            print(f"  > Error during bulk write of {len(batch)} posts: {write_err}")
+            inserted, skipped = 0, len(batch)
+        print(f"  Wrote {len(batch)} posts - Inserted: {inserted}, Skipped (duplicates): {skipped}")
+        inserted_total += inserted
+        skipped_total += skipped
+    return inserted_total, skipped_total
@@ -0,0 +1,73 @@
+# ----- postgres.py (Shared PostgreSQL Connection) -----
+import atexit        # Close the shared connection once, when the process exits
+import os            # Access environment variables (Replit Secrets)
+import sys
+import psycopg       # PostgreSQL driver (psycopg 3)
+
+# One connection per process, shared by the job collectors (they run one after another on it),
+# so the TLS handshake + auth to Neon is paid once per run instead of once per collector
+_pg_conn = None
+
+
+def get_connection():
+    global _pg_conn
+    if _pg_conn is None or _pg_conn.closed:
+        db_uri = os.environ.get('POSTGRES_URI')
+        if not db_uri:
+            raise RuntimeError("POSTGRES_URI secret not found or is empty!")
+        _pg_conn = psycopg.connect(db_uri)
+        atexit.register(_pg_conn.close)
+    return _pg_conn
+
+
+# Connection setup shared by the collector entry points: prints progress and exits the
+# process on failure, since nothing can be stored without the database
+def connect_job_database():
+    try:
+        print("Reading POSTGRES_URI from Replit Secrets...")
+        print("Connecting to external PostgreSQL database (Neon)...")
+        db_conn = get_connection()
+        print("Database connection successful!")
+        return db_conn
+    except Exception as db_err:
+        print(f">>> Database connection error: {db_err}")
+        print(">>> Please add the connection string from Neon (or your provider) to Replit Secrets.")
+        sys.exit(1)
+
+
+MISSING_TABLE_MESSAGE = "'job_postings' table does not exist! Run the CREATE TABLE script in your Neon SQL Editor first."
+
+
+# Raises if the job_postings table is missing (it is created by hand in the Neon SQL Editor)
+def check_job_postings_table(db_cursor):
+    db_cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'job_postings');")
+    if not db_cursor.fetchone()[0]:
+        raise RuntimeError(MISSING_TABLE_MESSAGE)
+    print("'job_postings' table found.")
+
+
+# Bulk-load job rows: COPY them into a session-local staging table (one streamed transfer, no
+# per-row statements), then move them into job_postings with a single INSERT ... SELECT that
+# keeps the ON CONFLICT (job_url) dedup. ON COMMIT DELETE ROWS empties the stage on commit.
+# The COPY uses the binary format: values go over the wire in Postgres' native encoding, so the
+# server skips text parsing (arrays, jsonb, timestamps) for every row.
+# columns/types describe each row (source is added as a constant); returns the rows inserted.
+def copy_into_job_postings(db_cursor, stage_table, columns, types, rows, source):
+    column_list = ', '.join(columns)
+    column_defs = ', '.join(f'{column} {column_type}' for column, column_type in zip(columns, types))
+    db_cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage_table} ({column_defs}) ON COMMIT DELETE ROWS;")
+    with db_cursor.copy(f"COPY {stage_table} ({column_list}) FROM STDIN (FORMAT BINARY)") as copy:
+        copy.set_types(types) # Required for binary: tells psycopg which binary dumper to use per column
+        for row in rows:
+            copy.write_row(row)
+    # Runs about once per collector run (one batch), so it is not prepared: a server-side
+    # prepare would only add a Parse round-trip that is never reused
+    db_cursor.execute(
+        f"""
+        INSERT INTO job_postings ({column_list}, source)
+        SELECT {column_list}, %s FROM {stage_table}
+        ON CONFLICT (job_url) DO NOTHING;
+        """,
+        (source,),
+    )
+    return db_cursor.rowcount
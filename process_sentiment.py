@@ -1,110 +1,154 @@
 # ----- process_sentiment.py (Corrected Syntax) -----
-import os
-import json
 from datetime import datetime
-from pymongo import MongoClient
+from pymongo import UpdateOne
 from pymongo.errors import ConnectionFailure
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer # Import VADER
 import sys
-import time
-
-print("--- Starting Sentiment Analysis Script ---")
-
-# --- Database Connection Setup ---
-mongo_client = None
-db = None
-posts_collection = None
-analyzer = None
-db_connection_ok = False
-vader_init_ok = False
-
-try:
-    # Try connecting to DB
-    print("Reading MONGO_URI from Replit Secrets...")
-    mongo_uri = os.environ.get('MONGO_URI')
-    if not mongo_uri:
-        print(">>> Error: MONGO_URI secret not found or is empty!")
-        sys.exit(1)
-
-    print("Connecting to MongoDB Atlas...")
-    mongo_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
-    mongo_client.admin.command('ismaster')
-    db = mongo_client['web3_data']
-    posts_collection = db['social_media_posts']
-    print("MongoDB connection successful!")
-    db_connection_ok = True
-
-    # Try initializing VADER
-    print("\nInitializing VADER Sentiment Analyzer...")
-    analyzer = SentimentIntensityAnalyzer()
-    print("VADER Analyzer initialized.")
-    vader_init_ok = True
-
-    # --- Proceed only if DB and VADER are ready ---
-    if db_connection_ok and vader_init_ok:
-
-        # --- Processing Logic ---
-        query = {"sentiment": {"$exists": False}}
-        process_limit = 50
-        print(f"\nQuerying MongoDB for up to {process_limit} documents needing sentiment analysis...")
-
-        documents_to_analyze = list(posts_collection.find(query).limit(process_limit))
-        print(f"Found {len(documents_to_analyze)} documents to analyze.")
-
-        if not documents_to_analyze:
-            print("No documents found requiring sentiment analysis at this time.")
-        else:
-            print("Starting sentiment analysis...")
-            updated_count = 0
-            error_count = 0
-
-            for doc in documents_to_analyze:
-                doc_id = doc.get("_id")
+from concurrent.futures import ThreadPoolExecutor # Scores the batch concurrently
+from mongo import get_client, MONGO_DB_NAME, POSTS_COLLECTION_NAME # Shared MongoDB connection
+
+# --- Sentiment Workers ---
+max_score_workers = 8
+# Shared VADER instance: the lexicon is loaded once, and polarity_scores keeps no per-call
+# state on the analyzer, so the scoring threads can all use it
+_analyzer = None
+
+def init_analyzer():
+    global _analyzer
+    _analyzer = SentimentIntensityAnalyzer()
+
+# Returns (scores, None) or (None, error message) so one bad text doesn't abort the batch.
+def score_text(text):
+    try:
+        return _analyzer.polarity_scores(text), None
+    except Exception as analysis_err:
+        return None, str(analysis_err)
+
+# Entry point shared by this script and run_all_tasks.py; mongo_client comes from the caller
+# (the shared client from mongo.py), which also owns closing it
+def run(mongo_client):
+    print("--- Starting Sentiment Analysis ---")
+
+    db_connection_ok = False
+    vader_init_ok = False
+
+    try:
+        posts_collection = mongo_client[MONGO_DB_NAME][POSTS_COLLECTION_NAME]
+        db_connection_ok = True
+
+        # Index so the "not analyzed yet" lookup avoids a collection scan; missing fields are
+        # indexed as null, which is what {$exists: false} scans for. (A partial index can't
+        # be used here: partialFilterExpression does not accept $exists: false.)
+        try:
+            posts_collection.create_index([("sentiment", 1)])
+            print("Index on 'sentiment' ensured.")
+        except Exception as index_err:
+            print(f"  Warning: Could not ensure index on 'sentiment': {index_err}")
+
+        # Try initializing VADER
+        print("\nInitializing VADER Sentiment Analyzer...")
+        init_analyzer()
+        print("VADER Analyzer initialized.")
+        vader_init_ok = True
+
+        # --- Proceed only if DB and VADER are ready ---
+        if db_connection_ok and vader_init_ok:
+
+            # --- Processing Logic ---
+            query = {"sentiment": {"$exists": False}}
+            process_limit = 50
+            print(f"\nQuerying MongoDB for up to {process_limit} documents needing sentiment analysis...")
+
+            # Only _id and text are used, so only those are sent back. The cursor is iterated
+            # (fetched in batches of 500) and only the texts worth scoring are kept, instead of
+            # first materializing every returned document in a list
+            cursor = posts_collection.find(query, {"_id": 1, "text": 1}).limit(process_limit).batch_size(500)
+            considered_count = 0
+            doc_ids = []
+            texts = []
+            for doc in cursor:
+                considered_count += 1
                 text_to_analyze = doc.get("text", "")
-
                 if not text_to_analyze or not isinstance(text_to_analyze, str) or len(text_to_analyze.strip()) < 5:
                     continue
-
-                try:
-                    vs = analyzer.polarity_scores(text_to_analyze)
-                    update_result = posts_collection.update_one(
+                doc_ids.append(doc.get("_id"))
+                texts.append(text_to_analyze)
+            print(f"Found {considered_count} documents to analyze.")
+
+            if not considered_count:
+                print("No documents found requiring sentiment analysis at this time.")
+            else:
+                print("Starting sentiment analysis...")
+                updated_count = 0
+                error_count = 0
+                write_batch_size = 500 # Max updates per bulk_write
+                analyzed_at = datetime.utcnow() # Same timestamp for the whole run
+                update_ops = []
+
+                # All updates for a batch go out in one bulk_write round-trip instead of one update_one each
+                def flush_updates(ops):
+                    nonlocal updated_count, error_count
+                    try:
+                        result = posts_collection.bulk_write(ops, ordered=False)
+                        updated_count += result.modified_count
+                        if result.modified_count < len(ops):
+                            print(f"  Warning: {len(ops) - result.modified_count} documents might not have been updated (modified_count=0).")
+                    except Exception as write_err:
+                        print(f"  > Error during bulk update of {len(ops)} documents: {write_err}")
+                        error_count += len(ops)
+
+                results = []
+                if texts:
+                    # map keeps the input order, so results still line up with doc_ids
+                    with ThreadPoolExecutor(max_workers=min(max_score_workers, len(texts))) as executor:
+                        results = list(executor.map(score_text, texts))
+
+                for doc_id, (vs, analysis_err) in zip(doc_ids, results):
+                    if analysis_err is not None:
+                        print(f"  > Error analyzing document {doc_id}: {analysis_err}")
+                        error_count += 1
+                        continue
+                    update_ops.append(UpdateOne(
                         {"_id": doc_id},
-                        {"$set": {"sentiment": vs, "sentiment_analyzed_at": datetime.utcnow()}}
-                    )
-                    if update_result.modified_count == 1:
-                        updated_count += 1
-                    else:
-                         print(f"  Warning: Document {doc_id} might not have been updated (modified_count=0).")
-
-                except Exception as analysis_err:
-                    print(f"  > Error analyzing/updating document {doc_id}: {analysis_err}")
-                    error_count += 1
-
-            # --- Analysis Summary --- (MOVED INSIDE the main try block's successful path)
-            print("\n--- Analysis Summary ---")
-            print(f"Documents Considered in this run: {len(documents_to_analyze)}")
-            print(f"Documents Successfully Updated: {updated_count}")
-            print(f"Errors Encountered During Analysis/Update: {error_count}")
-
-
-# --- Handle Initial Connection/Setup Errors ---
-except ConnectionFailure as conn_err:
-     print(f">>> MongoDB Atlas Connection Failure during setup: {conn_err}")
-     # Client might be None or partially initialized, closing handled in finally
-except Exception as setup_err:
-    print(f">>> Error during initial setup (DB or VADER): {setup_err}")
-    # Ensure cleanup happens in finally
-
-# --- Cleanup ---
-finally: # This now correctly follows the outer try/except block
-    print("\nClosing MongoDB connection (if active)...")
-    if mongo_client:
-        try:
-            mongo_client.close()
-            print("MongoDB connection closed.")
-        except Exception as close_err:
-            print(f">>> Error closing MongoDB connection: {close_err}")
-    else:
-         print("No MongoDB connection was active to close.")
-
-    print("\n--- Sentiment Analysis Script Finished ---")
\ No newline at end of file
+                        {"$set": {"sentiment": vs, "sentiment_analyzed_at": analyzed_at}}
+                    ))
+
+                    if len(update_ops) >= write_batch_size:
+                        flush_updates(update_ops)
+                        update_ops = []
+
+                if update_ops:
+                    flush_updates(update_ops)
+
+                # --- Analysis Summary --- (MOVED INSIDE the main try block's successful path)
+                print("\n--- Analysis Summary ---")
+                print(f"Documents Considered in this run: {considered_count}")
+                print(f"Documents Successfully Updated: {updated_count}")
+                print(f"Errors Encountered During Analysis/Update: {error_count}")
+
+
+    # --- Handle Initial Connection/Setup Errors ---
+    except ConnectionFailure as conn_err:
+         print(f">>> MongoDB Atlas Connection Failure during setup: {conn_err}")
+         # Client might be None or partially initialized, closing handled in finally
+    except Exception as setup_err:
+        print(f">>> Error during initial setup (DB or VADER): {setup_err}")
+        # Ensure cleanup happens in finally
+
+    # --- Cleanup ---
+    finally: # This now correctly follows the outer try/except block
+        print("\n--- Sentiment Analysis Finished ---")
+
+if __name__ == '__main__':
+    print("--- Starting Sentiment Analysis Script ---")
+    try:
+        print("Connecting to MongoDB Atlas (MONGO_URI from Replit Secrets)...")
+        client = get_client() # Closed by mongo.py at process exit
+        print("MongoDB connection successful!")
+    except ConnectionFailure as conn_err:
+        print(f">>> MongoDB Atlas Connection Failure during setup: {conn_err}")
+        sys.exit(1)
+    except Exception as setup_err:
+        print(f">>> MongoDB connection/setup error: {setup_err}")
+        sys.exit(1)
+    run(client)
@@ -1,60 +1,83 @@
-import subprocess
+import asyncio
 import time
-import sys
+import traceback
 from datetime import datetime
+import collect_web3career
+import scrape_cryptojobslist
+import collect
+import process_sentiment
+from mongo import get_client, get_collection # Shared MongoDB connection
+from postgres import get_connection # Shared PostgreSQL connection
 
-# List of scripts to run in order
-scripts_to_run = [
-    'collect_web3career.py',
-    'scrape_cryptojobslist.py',
-    'collect_reddit.py',
-    'collect_twitter.py',
-    'process_sentiment.py'
+# All collectors run in this one process: Python start-up, driver imports and the DB
+# connects (TLS + auth to Neon and Atlas) are paid once per run instead of once per script.
+
+# Job collectors share the PostgreSQL connection, so they run one after another
+job_collectors = [
+    collect_web3career,
+    scrape_cryptojobslist,
 ]
 
-print(f"--- Starting Task Runner at {datetime.utcnow().isoformat()} ---")
 
-for script_name in scripts_to_run:
-    print(f"\n>>> Running script: {script_name} <<<")
+# Run one collector, reporting (not raising) its errors so the rest of the pipeline still runs
+def run_step(name, func, *args):
+    print(f"\n>>> Running: {name} <<<")
     start_time = time.time()
     try:
-        # Use subprocess to run each script using python3
-        process = subprocess.run(
-            [sys.executable, script_name],  # Use sys.executable to ensure correct python version
-            capture_output=True,
-            text=True,
-            check=True,
-            timeout=900  # Set a timeout (e.g., 15 minutes) per script
-        )
-        # Print the output from the script
-        print(f"--- Output from {script_name} ---")
-        print(process.stdout)
-        if process.stderr:  # Print errors if any occurred
-            print(f"--- Errors from {script_name} ---")
-            print(process.stderr)
-        print(f"--- Finished {script_name} ---")
-
-    except subprocess.CalledProcessError as e:
-        # Script exited with an error code
-        print(f">>> Error running {script_name}: Exited with code {e.returncode}")
-        print(f"--- STDOUT ---:\n{e.stdout}")
-        print(f"--- STDERR ---:\n{e.stderr}")
-        break  # Stop if one script fails catastrophically
-
-    except subprocess.TimeoutExpired as e:
-        print(f">>> Timeout running {script_name} after {e.timeout} seconds.")
-        print(f"--- STDOUT ---:\n{e.stdout}")
-        print(f"--- STDERR ---:\n{e.stderr}")
-        break  # Stop if one script times out
+        func(*args)
+    except Exception as e:
+        print(f">>> Error running {name}: {e}")
+        traceback.print_exc()
+    print(f"{name} took {time.time() - start_time:.2f} seconds.")
+
+
+def run_job_collectors(pg_conn):
+    for module in job_collectors:
+        run_step(module.__name__, module.run, pg_conn)
+        # End whatever transaction the collector left open (or aborted) before the next one
+        pg_conn.rollback()
 
+
+async def run_social_collectors(mongo_client):
+    print("\n>>> Running: collect (Reddit + Twitter) <<<")
+    start_time = time.time()
+    try:
+        await collect.collect_social(get_collection(mongo_client))
     except Exception as e:
-        # Catch other potential errors during subprocess run
-        print(f">>> Unexpected error trying to run {script_name}: {e}")
-        break  # Stop on unexpected errors
+        print(f">>> Error running collect: {e}")
+        traceback.print_exc()
+    print(f"collect took {time.time() - start_time:.2f} seconds.")
+
+
+async def main():
+    pg_conn = None
+    mongo_client = None
+    try:
+        pg_conn = get_connection()
+        print("PostgreSQL connection successful!")
+    except Exception as db_err:
+        print(f">>> PostgreSQL connection error, skipping job collectors: {db_err}")
+    try:
+        mongo_client = get_client()
+        print("MongoDB connection successful!")
+    except Exception as db_err:
+        print(f">>> MongoDB connection error, skipping social collectors and sentiment: {db_err}")
+
+    # The blocking job collectors run in a worker thread while the async social collectors
+    # run on the event loop, so total time is roughly the slower of the two
+    steps = []
+    if pg_conn is not None:
+        steps.append(asyncio.to_thread(run_job_collectors, pg_conn))
+    if mongo_client is not None:
+        steps.append(run_social_collectors(mongo_client))
+    await asyncio.gather(*steps)
+
+    # Runs after the collectors finished (analyzes what they stored)
+    if mongo_client is not None:
+        run_step('process_sentiment', process_sentiment.run, mongo_client)
 
-    end_time = time.time()
-    print(f"Script {script_name} took {end_time - start_time:.2f} seconds.")
-    # Optional short pause between scripts
-    time.sleep(5)
 
-print(f"\n--- Task Runner Finished at {datetime.utcnow().isoformat()} ---")
+if __name__ == '__main__':
+    print(f"--- Starting Task Runner at {datetime.utcnow().isoformat()} ---")
+    asyncio.run(main())
+    print(f"\n--- Task Runner Finished at {datetime.utcnow().isoformat()} ---")
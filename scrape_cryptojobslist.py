@@ -1,47 +1,15 @@
 # ----- scrape_cryptojobslist.py (Updated Version 5 - With PostgreSQL Insertion) -----
 import requests
-from bs4 import BeautifulSoup
-import time
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from lxml import etree # Incremental HTML parsing (no full document tree)
 from urllib.parse import urljoin
 import re
-import psycopg2 # Import PostgreSQL driver
-import os
-import sys      # To cleanly exit on major errors
-from datetime import datetime # For timestamp
-
-print("--- Starting CryptoJobsList Scraper ---")
-
-# --- Database Connection Setup ---
-db_conn = None
-db_cursor = None
-try:
-    print("Reading POSTGRES_URI from Replit Secrets...")
-    db_uri = os.environ.get('POSTGRES_URI')
-    if not db_uri:
-        print(">>> Error: POSTGRES_URI secret not found or is empty!")
-        sys.exit(1)
-
-    print("Connecting to external PostgreSQL database (Neon)...")
-    db_conn = psycopg2.connect(db_uri)
-    db_cursor = db_conn.cursor()
-    print("Database connection successful!")
-
-    # Verify table exists
-    db_cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'job_postings');")
-    table_exists = db_cursor.fetchone()[0]
-    if not table_exists:
-         print(">>> Error: 'job_postings' table does not exist! Run CREATE TABLE script first.")
-         sys.exit(1)
-    else:
-        print("'job_postings' table found.")
-
-except Exception as db_err:
-    print(f">>> Database connection error: {db_err}")
-    if db_cursor: db_cursor.close()
-    if db_conn: db_conn.close()
-    sys.exit(1)
-
+from datetime import datetime, timezone # For timestamp
+import atexit
+import itertools
+import psycopg
+from postgres import MISSING_TABLE_MESSAGE, connect_job_database, copy_into_job_postings # Shared PostgreSQL connection (psycopg 3)
 
 # --- Scraper Configuration ---
 BASE_URL = 'https://cryptojobslist.com'
@@ -51,150 +19,286 @@ headers = {
 }
 REQUEST_TIMEOUT = 25
 POLITENESS_DELAY = 2
+SOURCE_NAME = 'CryptoJobsList'
+STREAM_CHUNK_SIZE = 64 * 1024 # Bytes of the response fed to the HTML parser at a time
+JOB_TABLE_CLASS = 'job-preview-inline-table'
+_LOC_PIN_RE = re.compile(r'^\s*📍\s*') # Leading pin emoji on the location text, compiled once
 
-# --- Scrape and Insert ---
-inserted_count = 0
-skipped_count = 0
-api_error = False # Reusing variable name, here means scraping error
-
-try:
-    # Step 1: Fetch HTML
-    print(f"\nAttempting to scrape: {target_url}")
-    response = requests.get(target_url, headers=headers, timeout=REQUEST_TIMEOUT)
-    print(f"Request sent. Status Code: {response.status_code}")
-    response.raise_for_status()
-    print("Successfully fetched page.")
-
-    # Step 2: Parse HTML
-    soup = BeautifulSoup(response.text, 'lxml')
-
-    # Step 3: Find Job Rows
-    table_body_selector = 'table.job-preview-inline-table tbody'
-    table_body = soup.select_one(table_body_selector)
-
-    if not table_body:
-        print(f"\n>>> ERROR: Could not find table body using selector: '{table_body_selector}'")
-        raise Exception("Table body not found, cannot proceed.") # Raise exception to trigger finally block
-
-    job_row_selector = 'tr[role="button"]'
-    job_rows = table_body.select(job_row_selector)
-    print(f"\nFound {len(job_rows)} potential job rows using selector '{job_row_selector}'.")
-
-    if not job_rows:
-        print("\n>>> Warning: No job rows found.")
-    else:
-        print(f"\nProcessing {len(job_rows)} potential job rows...")
-
-    # Step 4: Loop through rows, extract data, and insert into DB
-    for row_index, row in enumerate(job_rows):
-        if row.has_attr('class') and 'notAJobAd' in row['class']:
-            continue # Skip ads
-
-        # Extract data using previously validated logic
-        title_element = row.select_one('a.job-title-text')
-        company_element = row.select_one('a.job-company-name-text')
-        link_element = title_element
-        tag_elements = row.select('td.job-tags span.category')
-
-        title = title_element.get_text(strip=True) if title_element else 'N/A'
-        company = company_element.get_text(strip=True) if company_element else 'N/A'
-        tags_list = [tag.get_text(strip=True) for tag in tag_elements] if tag_elements else []
-        relative_link = link_element['href'] if link_element and link_element.has_attr('href') else None
-        job_url = urljoin(BASE_URL, relative_link) if relative_link else 'N/A'
-
-        salary = 'N/A'
-        salary_span = row.select_one('td span.align-middle')
-        if salary_span:
-             parent_div = salary_span.find_parent('div')
-             if parent_div and parent_div.select_one('svg[stroke="currentColor"]'):
-                  salary = salary_span.get_text(strip=True)
-
-        location = 'N/A'
-        potential_loc_td = None
-        tags_td = row.select_one('td.job-tags')
-        location_tds = row.select('td')
-        if tags_td:
-            potential_loc_td = tags_td.find_previous_sibling('td')
-        elif len(location_tds) >= 5:
-            potential_loc_td = location_tds[4]
-        if potential_loc_td:
-             location_span = potential_loc_td.select_one('span.text-sm')
-             if location_span:
-                  raw_location_text = location_span.get_text(strip=True)
-                  if salary == 'N/A' or salary != raw_location_text:
-                       location = re.sub(r'^\s*📍\s*', '', raw_location_text).strip()
-        if location == 'N/A' and 'Remote' in tags_list:
-             location = 'Remote'
-        is_remote = location == 'Remote' or 'Remote' in tags_list
-
-
-        # Insert data into PostgreSQL
-        if title != 'N/A' and job_url != 'N/A':
-            sql_insert_query = """
-                INSERT INTO job_postings (
-                    title, company_name, location, salary_range, tags, source,
-                    job_url, is_remote, collected_at
-                    -- external_id, description could be added if scraped from detail page later
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s
-                )
-                ON CONFLICT (job_url) DO NOTHING;
-            """
-            # Get current timestamp for collected_at
-            collected_timestamp = datetime.utcnow()
-
-            data_to_insert = (
-                title, company, location, salary if salary != 'N/A' else None, tags_list, 'CryptoJobsList',
-                job_url, is_remote, collected_timestamp
+# One pooled session: keep-alive connections (reused by later runs and any extra page fetches),
+# plus up to 5 GET retries with exponential backoff (1s, 2s, 4s, ...) on throttling/gateway
+# errors, so one transient failure does not abandon the run. requests already asks for gzip/deflate (and br
+# when the brotli package is installed), so Accept-Encoding is left at its default.
+session = requests.Session()
+session.headers.update(headers)
+session.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(total=5, status_forcelist=[429, 502, 503, 504], backoff_factor=1.0, allowed_methods=['GET']),
+))
+atexit.register(session.close) # Kept open across runs in a long-lived process
+
+# --- Bulk Load Configuration ---
+# Staged columns (in row order) and their Postgres types, see postgres.copy_into_job_postings
+STAGE_COLUMNS = ['title', 'company_name', 'location', 'salary_range', 'tags', 'job_url', 'is_remote', 'collected_at']
+STAGE_TYPES = ['text', 'text', 'text', 'text', 'text[]', 'text', 'bool', 'timestamp']
+
+
+# --- Row Parsing ---
+# Compiled once, evaluated per row. The class test matches a whole class token, like CSS '.name'.
+def class_xpath(path, class_name):
+    return etree.XPath(f"{path}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]")
+
+TITLE_XP = class_xpath('.//a', 'job-title-text')
+COMPANY_XP = class_xpath('.//a', 'job-company-name-text')
+TAG_XP = class_xpath('.//span', 'category')
+SALARY_SPAN_XP = class_xpath('.//span', 'align-middle')
+LOCATION_SPAN_XP = class_xpath('.//span', 'text-sm')
+CURRENT_COLOR_SVG_XP = etree.XPath('.//svg[@stroke="currentColor"]')
+
+
+def first_match(xpath, element):
+    matches = xpath(element)
+    return matches[0] if matches else None
+
+
+def has_class(element, class_name):
+    return class_name in (element.get('class') or '').split()
+
+
+# Stripped text pieces of the element joined together (same as bs4's get_text(strip=True))
+def text_of(element):
+    return ''.join(text.strip() for text in element.itertext())
+
+
+# True for the job table's <tbody>, and for the <tr> rows directly inside it
+def in_job_table(element):
+    body = element if element.tag == 'tbody' else element.getparent()
+    if body is None or body.tag != 'tbody':
+        return False
+    table = body.getparent()
+    return table is not None and table.tag == 'table' and has_class(table, JOB_TABLE_CLASS)
+
+
+# Feeds the streamed response to lxml's pull parser and yields the job table's <tr> rows as soon
+# as each one is complete, then its <tbody> once the table ends. Only the finished job rows are
+# cleared and dropped from the tree, so the table never holds more than the row being parsed;
+# the rest of the page (head, scripts, nav) stays in the tree until the parse ends. The body is
+# never copied into a str as with response.text.
+def iter_job_table_elements(response):
+    # Without a charset in the headers requests would assume ISO-8859-1; the site serves UTF-8
+    content_type = response.headers.get('Content-Type', '')
+    encoding = response.encoding if 'charset' in content_type.lower() else 'utf-8'
+    parser = etree.HTMLPullParser(events=('end',), tag=('tbody', 'tr'), encoding=encoding)
+    chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE) # Undoes gzip/deflate
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is None:
+            parser.close() # Flush whatever is still buffered at the end of the body
+        else:
+            parser.feed(chunk)
+        for _, element in parser.read_events():
+            if not in_job_table(element):
+                # Left alone: a <tr> of a table nested in a job row's cell is part of that
+                # row, which is still being parsed
+                continue
+            yield element
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
+# Checkpoint from earlier runs: every job URL already stored for this source, so their rows are
+# skipped before being parsed any further and only new jobs are sent to the database (listings
+# stay on the homepage for weeks, so a time window would let long-lived repeats through)
+def load_known_urls(db_cursor):
+    db_cursor.execute("SELECT job_url FROM job_postings WHERE source = %s;", (SOURCE_NAME,))
+    return {known_url for (known_url,) in db_cursor.fetchall()}
+
+
+# Entry point shared by this script and run_all_tasks.py; db_conn comes from the caller so
+# every job collector in the process reuses one PostgreSQL connection.
+# Raises if the table is missing instead of exiting the process.
+def run(db_conn):
+    print("--- Starting CryptoJobsList Scraper ---")
+    db_cursor = db_conn.cursor()
+    try:
+        # First query on job_postings, so it doubles as the table check (no separate EXISTS round-trip)
+        known_urls = load_known_urls(db_cursor)
+        print(f"'job_postings' table found. Loaded {len(known_urls)} already stored job URLs.")
+    except psycopg.errors.UndefinedTable:
+        db_cursor.close()
+        raise RuntimeError(MISSING_TABLE_MESSAGE) from None
+    except Exception:
+        db_cursor.close()
+        raise
+
+    # --- Scrape and Insert ---
+    inserted_count = 0
+    skipped_count = 0
+    api_error = False # Reusing variable name, here means scraping error
+
+    try:
+        # Step 1: Fetch HTML (streamed: the body is read while it is being parsed)
+        print(f"\nAttempting to scrape: {target_url}")
+        response = session.get(target_url, timeout=REQUEST_TIMEOUT, stream=True)
+        print(f"Request sent. Status Code: {response.status_code}")
+        response.raise_for_status()
+        print("Streaming page...")
+
+        # Single-row insert, only used when the bulk COPY path fails
+        sql_insert_query = """
+            INSERT INTO job_postings (
+                title, company_name, location, salary_range, tags,
+                job_url, is_remote, collected_at, source
+                -- external_id, description could be added if scraped from detail page later
+            ) VALUES (
+                %s, %s, %s, %s, %s, %s, %s, %s, %s
             )
+            ON CONFLICT (job_url) DO NOTHING;
+        """
+        rows_to_insert = []
+        # One collected_at for the whole scrape: every row comes from the same page fetch. Naive UTC,
+        # staged as timestamp, so it is stored verbatim whatever the session TimeZone is
+        collected_timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
 
-            try:
-                db_cursor.execute(sql_insert_query, data_to_insert)
-                if db_cursor.rowcount > 0:
-                    inserted_count += 1
-                else:
-                    skipped_count += 1 # Likely duplicate based on job_url
-            except Exception as insert_err:
-                print(f"  > DB insert error for job URL {job_url}: {insert_err}")
-                db_conn.rollback() # Rollback failed transaction
+        # Step 2: Parse HTML and extract each job row as soon as it has been parsed
+        table_found = False
+        job_row_count = 0
+        for row in iter_job_table_elements(response):
+            if row.tag == 'tbody':
+                table_found = True # Arrives after its rows
+                continue
+            if row.get('role') != 'button':
+                continue
+            job_row_count += 1
+            if has_class(row, 'notAJobAd'):
+                continue # Skip ads
+
+            # Extract data using previously validated logic (compiled XPath per field)
+            title_element = first_match(TITLE_XP, row)
+            company_element = first_match(COMPANY_XP, row)
+            link_element = title_element
+            # One walk over the row's cells: the tags cell, and the location cell right before it
+            # (no tags cell: the location is in the 5th cell)
+            tds = row.findall('td') # Direct children only
+            tags_td = None
+            potential_loc_td = tds[4] if len(tds) >= 5 else None
+            for cell_index, td in enumerate(tds):
+                if has_class(td, 'job-tags'):
+                    tags_td = td
+                    potential_loc_td = tds[cell_index - 1] if cell_index > 0 else None
+                    break
+            tag_elements = TAG_XP(tags_td) if tags_td is not None else []
+
+            # lxml elements without children are falsy, hence the explicit None checks
+            title = text_of(title_element) if title_element is not None else 'N/A'
+            company = text_of(company_element) if company_element is not None else 'N/A'
+            tags_list = [text_of(tag) for tag in tag_elements]
+            relative_link = link_element.get('href') if link_element is not None else None
+            job_url = urljoin(BASE_URL, relative_link) if relative_link else 'N/A'
+            if job_url in known_urls:
+                skipped_count += 1 # Already stored by an earlier run
+                continue
+
+            salary = 'N/A'
+            salary_span = first_match(SALARY_SPAN_XP, row) # Every descendant of the row sits in a td
+            if salary_span is not None:
+                 parent_div = next(salary_span.iterancestors('div'), None)
+                 if parent_div is not None and CURRENT_COLOR_SVG_XP(parent_div):
+                      salary = text_of(salary_span)
+
+            location = 'N/A'
+            if potential_loc_td is not None:
+                 location_span = first_match(LOCATION_SPAN_XP, potential_loc_td)
+                 if location_span is not None:
+                      raw_location_text = text_of(location_span)
+                      if salary == 'N/A' or salary != raw_location_text:
+                           location = _LOC_PIN_RE.sub('', raw_location_text).strip()
+            if location == 'N/A' and 'Remote' in tags_list:
+                 location = 'Remote'
+            is_remote = location == 'Remote' or 'Remote' in tags_list
+
+
+            # Collect rows for one batched insert after the loop
+            if title != 'N/A' and job_url != 'N/A':
+                rows_to_insert.append((
+                    title, company, location, salary if salary != 'N/A' else None, tags_list,
+                    job_url, is_remote, collected_timestamp
+                ))
+            else:
+                print(f"Skipping row - Missing title or URL. Title: {title}, URL: {job_url}")
                 skipped_count += 1
+
+        if not table_found:
+            print(f"\n>>> ERROR: Could not find the tbody of table.{JOB_TABLE_CLASS}")
+            raise Exception("Table body not found, cannot proceed.") # Raise exception to trigger finally block
+        print(f"\nProcessed {job_row_count} potential job rows (tr[role=\"button\"]).")
+        if not job_row_count:
+            print("\n>>> Warning: No job rows found.")
+
+        # Step 3: Insert all rows into PostgreSQL
+        if rows_to_insert:
+            try:
+                # COPY into a staging table + one INSERT ... SELECT (conflicts/duplicates are not counted)
+                batch_inserted = copy_into_job_postings(
+                    db_cursor, 'cryptojobslist_stage', STAGE_COLUMNS, STAGE_TYPES, rows_to_insert, SOURCE_NAME
+                )
+                inserted_count += batch_inserted
+                skipped_count += len(rows_to_insert) - batch_inserted
+            except Exception as batch_err:
+                print(f"  > DB batch insert error, retrying row by row: {batch_err}")
+                db_conn.rollback() # Nothing from the failed batch is kept
+                # One transaction for the whole retry, committed once when the block exits
+                with db_conn.transaction():
+                    for data_to_insert in rows_to_insert:
+                        try:
+                            # Nested block = savepoint: a failed insert rolls back only itself,
+                            # not the rows already inserted in this transaction
+                            with db_conn.transaction():
+                                # prepare=True: parsed/planned once, then only EXECUTEd for the other rows
+                                db_cursor.execute(sql_insert_query, data_to_insert + (SOURCE_NAME,), prepare=True)
+                        except Exception as insert_err:
+                            print(f"  > DB insert error for job URL {data_to_insert[5]}: {insert_err}")
+                            skipped_count += 1
+                            continue
+                        if db_cursor.rowcount > 0:
+                            inserted_count += 1
+                        else:
+                            skipped_count += 1 # Likely duplicate based on job_url
+
+        # Commit all successful insertions after the loop
+        if inserted_count > 0:
+            print(f"\nAttempting to commit {inserted_count} insertions...")
+            db_conn.commit()
+            print("Database commit successful.")
         else:
-            print(f"Skipping row - Missing title or URL. Title: {title}, URL: {job_url}")
-            skipped_count += 1
-
-    # Commit all successful insertions after the loop
-    if inserted_count > 0:
-        print(f"\nAttempting to commit {inserted_count} insertions...")
-        db_conn.commit()
-        print("Database commit successful.")
-    else:
-        print("\nNo new jobs were inserted (they might be duplicates or had errors).")
-
-
-# --- Error Handling ---
-except requests.exceptions.HTTPError as http_err:
-    print(f"\n>>> HTTP error occurred: {http_err}")
-    print(f"Verify the target URL is correct: {target_url}")
-    api_error = True
-except requests.exceptions.RequestException as req_err:
-    print(f"\n>>> Request error occurred: {req_err}")
-    api_error = True
-except Exception as proc_err:
-    print(f"\n>>> An unexpected error occurred during scraping/processing: {proc_err}")
-    api_error = True
-    import traceback
-    traceback.print_exc()
-
-# --- Cleanup ---
-finally:
-    print("\n--- Final Summary ---")
-    print(f"Jobs Inserted: {inserted_count}")
-    print(f"Jobs Skipped (Duplicate/Error/Incomplete): {skipped_count}")
-    if api_error:
-         print(">>> There was an error fetching or processing data from the website.")
-
-    print("Closing database connection...")
-    if db_cursor: db_cursor.close()
-    if db_conn: db_conn.close()
-    print("Database connection closed.")
-    print("\n--- CryptoJobsList Scraper Finished ---")
\ No newline at end of file
+            print("\nNo new jobs were inserted (they might be duplicates or had errors).")
+
+
+    # --- Error Handling ---
+    except requests.exceptions.HTTPError as http_err:
+        print(f"\n>>> HTTP error occurred: {http_err}")
+        print(f"Verify the target URL is correct: {target_url}")
+        api_error = True
+    except requests.exceptions.RequestException as req_err:
+        print(f"\n>>> Request error occurred: {req_err}")
+        api_error = True
+    except Exception as proc_err:
+        print(f"\n>>> An unexpected error occurred during scraping/processing: {proc_err}")
+        api_error = True
+        import traceback
+        traceback.print_exc()
+
+    # --- Cleanup ---
+    finally:
+        print("\n--- Final Summary ---")
+        print(f"Jobs Inserted: {inserted_count}")
+        print(f"Jobs Skipped (Duplicate/Error/Incomplete): {skipped_count}")
+        if api_error:
+             print(">>> There was an error fetching or processing data from the website.")
+
+        db_cursor.close() # The connection itself belongs to the caller
+        print("\n--- CryptoJobsList Scraper Finished ---")
+
+
+if __name__ == '__main__':
+    run(connect_job_database())
@@ -1,59 +1,65 @@
 # ----- test_imports.py -----
 import sys
-import importlib
+import importlib.util
 import traceback # Include traceback for more detail on unexpected errors
+from concurrent.futures import ThreadPoolExecutor
 
 print(f"--- Running Import Test ---")
 print(f"Using Python version: {sys.version}")
 errors_found = 0
+# find_spec only locates each package (no module code runs); pass --verify-classes to also
+# really import the classes the scripts use (slower: runs the libraries' import-time setup)
+verify_classes = '--verify-classes' in sys.argv[1:]
 
 # List the *package* or *top-level module* names as typically imported
 # These should align with what you installed via requirements.txt
 libs_to_test = [
     'requests',
-    'bs4',          # Installs beautifulsoup4, import as bs4
     'lxml',
-    'psycopg2',     # psycopg2-binary installs this module name
+    'psycopg',      # psycopg 3 (psycopg[binary])
+    'orjson',
+    'ijson',
     'pymongo',
-    'praw',
+    'asyncpraw',
     'tweepy',
     'vaderSentiment.vaderSentiment' # Specific path needed for class import later
 ]
 
-print('\nChecking library imports...')
-print('----------------------------')
 
-for lib_path in libs_to_test:
+# Checks one library; returns (ok, report) so the results can be printed in list order
+def probe(lib_path):
+    module_name_to_import = lib_path.split('.')[0] # Get the base name to import first
     try:
-        module_name_to_import = lib_path.split('.')[0] # Get the base name to import first
-
-        print(f"- Checking {lib_path}... ", end="") # Print without newline initially
-
-        # Attempt to import the base module
-        module = importlib.import_module(module_name_to_import)
+        # Locate the base module without executing it
+        if importlib.util.find_spec(module_name_to_import) is None:
+            raise ImportError(f"No module named '{module_name_to_import}'")
 
         # Add specific checks for known classes if needed for extra validation
-        if module_name_to_import == 'bs4':
-            from bs4 import BeautifulSoup
-            print(f"✓ ({module_name_to_import} - BeautifulSoup OK)")
-        elif module_name_to_import == 'vaderSentiment':
+        if verify_classes and module_name_to_import == 'vaderSentiment':
             from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-            print(f"✓ ({module_name_to_import} - SIA OK)")
-        elif module_name_to_import == 'psycopg2':
-             # Can optionally check db connection details here if needed, but usually just import is fine
-             print(f"✓ ({module_name_to_import})") # psycopg2 doesn't have an obvious class to import simply
-        else:
-             # For others, just the base import is usually sufficient
-             print(f"✓ ({module_name_to_import})")
+            return True, f"✓ ({module_name_to_import} - SIA OK)"
+        # For others, just locating the base module is usually sufficient
+        return True, f"✓ ({module_name_to_import})"
 
     except ImportError as e:
-        print(f"\n✗ FAIL: Error importing {lib_path}: {e}")
-        errors_found += 1
+        return False, f"\n✗ FAIL: Error importing {lib_path}: {e}"
     except Exception as e_gen:
-        print(f"\n✗ FAIL: Unexpected error testing import {lib_path}: {e_gen}")
-        print("--- Traceback ---")
-        traceback.print_exc() # Print full traceback for unexpected errors
-        print("-----------------")
+        # Full traceback for unexpected errors
+        return False, (f"\n✗ FAIL: Unexpected error testing import {lib_path}: {e_gen}\n"
+                       f"--- Traceback ---\n{traceback.format_exc()}-----------------")
+
+
+print('\nChecking library imports...')
+print('----------------------------')
+
+# The probes are independent (mostly filesystem lookups / .so loads), so they run concurrently;
+# ex.map keeps the input order for the report
+with ThreadPoolExecutor(max_workers=len(libs_to_test)) as ex:
+    results = list(ex.map(probe, libs_to_test))
+
+for lib_path, (ok, report) in zip(libs_to_test, results):
+    print(f"- Checking {lib_path}... {report}")
+    if not ok:
         errors_found += 1
 
 # --- Summary and Exit ---